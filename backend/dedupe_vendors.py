@@ -0,0 +1,52 @@
+"""
+Resolve duplicados em vendors antes dos índices únicos de email e nome_loja.
+Lojas repetidas: a mais antiga mantém o nome, as demais ganham sufixo numérico
+(muda o link público dessas lojas). Emails repetidos só são listados para revisão manual.
+Uso: python dedupe_vendors.py
+"""
+import asyncio
+
+from pymongo.errors import DuplicateKeyError
+
+from server import client, db
+
+
+def duplicates(field):
+    """Grupos de vendedores com o mesmo valor em field, do mais antigo ao mais novo"""
+    return db.vendors.aggregate([
+        {"$sort": {"created_at": 1}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}}
+    ], allowDiskUse=True)
+
+
+async def main():
+    try:
+        renamed = 0
+        async for group in duplicates("nome_loja"):
+            suffix = 2
+            for vendor_id in group["ids"][1:]:
+                while await db.vendors.count_documents({"nome_loja": f"{group['_id']}_{suffix}"}, limit=1):
+                    suffix += 1
+                nome_loja = f"{group['_id']}_{suffix}"
+                await db.vendors.update_one({"id": vendor_id}, {"$set": {"nome_loja": nome_loja}})
+                print(f"Loja {vendor_id}: {group['_id']} -> {nome_loja}")
+                renamed += 1
+                suffix += 1
+        print(f"{renamed} lojas renomeadas")
+
+        async for group in duplicates("email"):
+            print(f"Email duplicado (revisar manualmente): {group['_id']} -> {', '.join(group['ids'])}")
+
+        for field in ("email", "nome_loja"):
+            try:
+                await db.vendors.create_index(field, unique=True)
+                print(f"Índice único vendors.{field} criado")
+            except DuplicateKeyError:
+                print(f"Índice único vendors.{field} não criado: ainda há duplicados")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+"""
+Converte created_at legado (string ISO) em data BSON em vendors, products e orders.
+Strings e datas ordenam separadas no MongoDB, o que quebra a paginação por cursor.
+Valores que não são datas válidas ficam como estão e são listados ao final.
+Uso: python migrate_created_at.py
+"""
+import asyncio
+
+from server import client, db
+
+
+async def main():
+    try:
+        for collection in (db.vendors, db.products, db.orders):
+            result = await collection.update_many(
+                {"created_at": {"$type": "string"}},
+                [{"$set": {"created_at": {
+                    "$convert": {"input": "$created_at", "to": "date", "onError": "$created_at"}
+                }}}]
+            )
+            print(f"{collection.name}: {result.modified_count} datas convertidas")
+            async for doc in collection.find({"created_at": {"$type": "string"}}, {"_id": 0, "id": 1, "created_at": 1}):
+                print(f"{collection.name}: {doc['id']} com created_at inválido: {doc['created_at']!r}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
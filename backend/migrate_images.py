@@ -0,0 +1,41 @@
+"""
+Migra imagens base64 legadas dos produtos para o object storage.
+Uso: S3_BUCKET=... python migrate_images.py
+"""
+import asyncio
+import logging
+
+from server import client, db, s3, store_product_image
+
+logger = logging.getLogger("migrate_images")
+
+
+async def main():
+    if s3 is None:
+        print("S3_BUCKET não configurado - nada a migrar")
+        client.close()
+        return
+    migrated = failed = 0
+    try:
+        async for product in db.products.find(
+            {"imagem": {"$nin": [None, ""]}}, {"_id": 0, "id": 1, "vendor_id": 1, "imagem": 1}
+        ):
+            # Uma imagem inválida não deve interromper a migração das demais
+            try:
+                await store_product_image(product, product["vendor_id"], product["id"])
+                await db.products.update_one(
+                    {"id": product["id"]},
+                    {"$set": {"imagem": None, "imagem_url": product["imagem_url"]}}
+                )
+            except Exception:
+                logger.exception("Falha ao migrar imagem do produto %s", product["id"])
+                failed += 1
+            else:
+                migrated += 1
+        print(f"{migrated} imagens migradas, {failed} falhas")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,14 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Query
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -11,8 +16,14 @@ from typing import List, Optional
 import uuid
 from datetime import datetime
 import jwt
+from jwt.utils import base64url_decode
 import bcrypt
 import base64
+import hashlib
+import hmac
+import orjson
+from cachetools import TTLCache
+import boto3
 
 
 ROOT_DIR = Path(__file__).parent
@@ -20,11 +31,25 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Pool maior para rajadas nas listagens/dashboard; compressão reduz o tráfego de /loja
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get("MONGO_MAX_POOL_SIZE", "200")),
+    minPoolSize=int(os.environ.get("MONGO_MIN_POOL_SIZE", "20")),
+    compressors=os.environ.get("MONGO_COMPRESSORS", "zstd,zlib")
+)
 db = client[os.environ['DB_NAME']]
+# Definido no startup: transações exigem replica set ou mongos
+_supports_transactions = False
+
+# Armazenamento de imagens (S3/GCS/MinIO). Sem S3_BUCKET, imagens continuam em base64 no documento
+S3_BUCKET = os.environ.get("S3_BUCKET")
+S3_PUBLIC_URL = os.environ.get("S3_PUBLIC_URL")  # ex.: https://cdn.meusite.com
+s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL")) if S3_BUCKET else None
 
 # Create the main app without a prefix
-app = FastAPI()
+# orjson serializa listas grandes (e datetime) bem mais rápido que o json padrão
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -33,6 +58,26 @@ api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 JWT_SECRET = os.environ.get("JWT_SECRET", "changeme-unsafe")
 JWT_ALGORITHM = "HS256"
+# Custo do bcrypt (12 em produção; 10 costuma bastar em desenvolvimento)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# Fuso usado para agrupar vendas por dia no dashboard
+BR_TIMEZONE = "America/Sao_Paulo"
+
+# Cache de autenticação: sha256(token) -> vendor. TTL curto limita dados obsoletos.
+_auth_cache = TTLCache(maxsize=10_000, ttl=30)
+# Falhas de autenticação: sha256(token) -> detail do 401
+_auth_fail_cache = TTLCache(maxsize=10_000, ttl=30)
+
+# Totais das listagens paginadas: (coleção, vendor_id) -> count
+_count_cache = TTLCache(maxsize=1024, ttl=60)
+
+# Métricas do dashboard por vendor_id
+_dashboard_cache = TTLCache(maxsize=10_000, ttl=30)
+
+# Respostas públicas (/stores/all, /loja/{nome_loja}): chave -> (body, etag)
+PUBLIC_CACHE_TTL = 60
+_public_cache = TTLCache(maxsize=10_000, ttl=PUBLIC_CACHE_TTL)
 
 # Models
 class Vendor(BaseModel):
@@ -71,7 +116,8 @@ class Product(BaseModel):
     preco: float
     quantidade: int
     categoria: str
-    imagem: Optional[str] = None  # Base64 encoded image
+    imagem: Optional[str] = None  # Base64 (legado, ou quando não há object storage)
+    imagem_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class ProductCreate(BaseModel):
@@ -80,6 +126,7 @@ class ProductCreate(BaseModel):
     preco: float
     quantidade: int
     categoria: str
+    # Base64/data URL a ser enviado ao object storage, ou URL existente; imagem_url é sempre derivado daqui
     imagem: Optional[str] = None
 
 class Order(BaseModel):
@@ -102,27 +149,213 @@ class OrderCreate(BaseModel):
     observacoes: Optional[str] = None
     items: List[dict]
 
+# Garante na importação que todos os validadores estão montados (nada adiado para o primeiro request)
+for _model in (Vendor, VendorCreate, VendorLogin, VendorResponse, Product, ProductCreate, Order, OrderCreate):
+    _model.model_rebuild(raise_errors=True)
+    _model.__pydantic_validator__
+
+# Projeções: só os campos dos modelos, sem _id
+PRODUCT_PROJECTION = {"_id": 0, **{field: 1 for field in Product.model_fields}}
+ORDER_PROJECTION = {"_id": 0, **{field: 1 for field in Order.model_fields}}
+
 # Helper functions
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+# Só aceitamos formatos que o navegador exibe com segurança; o tipo vem dos bytes, não do cliente
+IMAGE_SIGNATURES = ((b"\x89PNG\r\n\x1a\n", "image/png", "png"), (b"\xff\xd8\xff", "image/jpeg", "jpg"))
+MAX_IMAGE_BYTES = int(os.environ.get("MAX_IMAGE_BYTES", 5 * 1024 * 1024))
+
+def sniff_image(data: bytes):
+    """Retorna (content_type, extensão) a partir dos bytes; 400 se não for png/jpeg/webp ou passar do limite"""
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="Imagem muito grande")
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    for signature, content_type, ext in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type, ext
+    raise HTTPException(status_code=400, detail="Formato de imagem não suportado (use PNG, JPEG ou WebP)")
+
+def _put_image(key: str, data: bytes, content_type: str) -> str:
+    s3.put_object(Bucket=S3_BUCKET, Key=key, Body=data, ContentType=content_type)
+    base_url = S3_PUBLIC_URL or f"https://{S3_BUCKET}.s3.amazonaws.com"
+    return f"{base_url.rstrip('/')}/{key}"
+
+async def upload_image(vendor_id: str, product_id: str, data: bytes) -> str:
+    content_type, ext = sniff_image(data)
+    # Hash do conteúdo na chave: nova imagem => nova URL, sem servir a antiga do cache da CDN
+    key = f"products/{vendor_id}/{product_id}/{hashlib.blake2b(data, digest_size=8).hexdigest()}.{ext}"
+    return await asyncio.get_running_loop().run_in_executor(None, _put_image, key, data, content_type)
+
+def image_data_url(data: bytes) -> str:
+    content_type, _ = sniff_image(data)
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+def decode_image(imagem: str) -> bytes:
+    """Aceita data URL ("data:image/png;base64,...") ou base64 puro; o tipo declarado é ignorado"""
+    if imagem.startswith("data:"):
+        imagem = imagem.split(",", 1)[-1]
+    # base64 ocupa ~4/3 do tamanho original: barra antes de decodificar
+    if len(imagem) > MAX_IMAGE_BYTES * 4 // 3 + 4:
+        raise HTTPException(status_code=400, detail="Imagem muito grande")
+    try:
+        return base64.b64decode(imagem, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Imagem inválida")
+
+async def store_product_image(product_dict: dict, vendor_id: str, product_id: str) -> None:
+    """Envia a imagem do produto ao object storage e guarda só a URL no documento"""
+    imagem = product_dict.get("imagem")
+    product_dict["imagem_url"] = None
+    if not imagem:
+        return
+    if imagem.startswith(("http://", "https://")):
+        product_dict["imagem_url"] = imagem
+    elif s3 is not None:
+        product_dict["imagem_url"] = await upload_image(vendor_id, product_id, decode_image(imagem))
+    else:
+        product_dict["imagem"] = image_data_url(decode_image(imagem))
+        return
+    product_dict["imagem"] = None
+
+# Hash descartável: login com email inexistente gasta o mesmo tempo de bcrypt
+_DUMMY_HASH = hash_password("senha-inexistente")
+
 def create_access_token(vendor_id: str) -> str:
     return jwt.encode({"vendor_id": vendor_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def _auth_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+def invalidate_auth_cache(token: str) -> None:
+    """Remove o token do cache (ex.: logout ou troca de senha)"""
+    _auth_cache.pop(_auth_cache_key(token), None)
+
+# Verificação HS256 direta. O cabeçalho que emitimos é reconhecido sem parse; outros
+# (ex.: PyJWT mais novo serializando as chaves em outra ordem) são decodificados e checados
+_JWT_KEY = JWT_SECRET.encode('utf-8')
+_JWT_HEADER_B64 = create_access_token("").split(".", 1)[0].encode('ascii')
+
+def _check_jwt_header(header_b64: bytes) -> None:
+    try:
+        header = orjson.loads(base64url_decode(header_b64))
+    except (ValueError, orjson.JSONDecodeError):
+        raise jwt.DecodeError("Cabeçalho inválido")
+    if not isinstance(header, dict) or header.get("alg") != "HS256" or header.get("typ", "JWT") != "JWT":
+        raise jwt.InvalidAlgorithmError("Cabeçalho não suportado")
+
+def decode_access_token(token: str) -> dict:
+    try:
+        header_b64, payload_b64, sig_b64 = token.encode('ascii').split(b".")
+        signature = base64url_decode(sig_b64)
+    except (ValueError, UnicodeEncodeError):
+        raise jwt.DecodeError("Token malformado")
+    if header_b64 != _JWT_HEADER_B64:
+        _check_jwt_header(header_b64)
+    expected = hmac.new(_JWT_KEY, header_b64 + b"." + payload_b64, hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise jwt.InvalidSignatureError("Assinatura inválida")
+    try:
+        payload = orjson.loads(base64url_decode(payload_b64))
+    except (ValueError, orjson.JSONDecodeError):
+        raise jwt.DecodeError("Payload inválido")
+    if not isinstance(payload, dict) or "vendor_id" not in payload:
+        raise jwt.MissingRequiredClaimError("vendor_id")
+    return payload
+
 async def get_current_vendor(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    key = _auth_cache_key(credentials.credentials)
+    vendor = _auth_cache.get(key)
+    if vendor is not None:
+        return vendor
+    # Token que já falhou recentemente: responde sem decodificar nem consultar o banco
+    detail = _auth_fail_cache.get(key)
+    if detail is not None:
+        raise HTTPException(status_code=401, detail=detail)
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = decode_access_token(credentials.credentials)
         vendor_id = payload.get("vendor_id")
         vendor = await db.vendors.find_one({"id": vendor_id})
         if not vendor:
+            _auth_fail_cache[key] = "Vendedor não encontrado"
             raise HTTPException(status_code=401, detail="Vendedor não encontrado")
+        _auth_cache[key] = vendor
         return vendor
     except jwt.InvalidTokenError:
+        _auth_fail_cache[key] = "Token inválido"
         raise HTTPException(status_code=401, detail="Token inválido")
 
+async def count_for_vendor(collection, vendor_id: str, exact: bool = False) -> int:
+    key = (collection.name, vendor_id)
+    if not exact and key in _count_cache:
+        return _count_cache[key]
+    total = await collection.count_documents({"vendor_id": vendor_id})
+    _count_cache[key] = total
+    return total
+
+def invalidate_count_cache(collection_name: str, vendor_id: str) -> None:
+    _count_cache.pop((collection_name, vendor_id), None)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca do If-None-Match (RFC 9110): aceita lista, prefixo W/ e *"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+async def cached_public_response(request: Request, key: str, build) -> Response:
+    """Resposta JSON pública com cache em memória, ETag e 304 para If-None-Match"""
+    cached = _public_cache.get(key)
+    if cached is None:
+        body = orjson.dumps(jsonable_encoder(await build()))
+        cached = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+        _public_cache[key] = cached
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={PUBLIC_CACHE_TTL}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def invalidate_store_cache(nome_loja: str) -> None:
+    _public_cache.pop(f"store:{nome_loja}", None)
+    _public_cache.pop("stores:all", None)
+
+# Paginação por cursor (keyset em created_at, id)
+_KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc['created_at']
+    # Documentos legados guardavam created_at como string ISO (ver migrate_created_at.py)
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    raw = f"{created_at.isoformat()}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        ts, doc_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), doc_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def keyset_query(query: dict, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return query
+    c_ts, c_id = decode_cursor(cursor)
+    return {
+        **query,
+        "$or": [
+            {"created_at": {"$lt": c_ts}},
+            {"created_at": c_ts, "id": {"$lt": c_id}}
+        ]
+    }
+
 # Auth routes
 @api_router.post("/auth/register")
 async def register_vendor(vendor_data: VendorCreate):
@@ -133,11 +366,18 @@ async def register_vendor(vendor_data: VendorCreate):
     
     # Hash password
     vendor_dict = vendor_data.dict()
-    vendor_dict["senha"] = hash_password(vendor_data.senha)
+    # bcrypt é CPU-bound: roda no thread pool para não travar o event loop
+    vendor_dict["senha"] = await asyncio.get_running_loop().run_in_executor(
+        None, hash_password, vendor_data.senha
+    )
     vendor_dict["id"] = str(uuid.uuid4())
     vendor_dict["created_at"] = datetime.utcnow()
     
-    await db.vendors.insert_one(vendor_dict)
+    try:
+        await db.vendors.insert_one(vendor_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email ou nome da loja já cadastrado")
+    _public_cache.pop("stores:all", None)
     
     # Create access token
     access_token = create_access_token(vendor_dict["id"])
@@ -150,7 +390,12 @@ async def register_vendor(vendor_data: VendorCreate):
 @api_router.post("/auth/login")
 async def login_vendor(login_data: VendorLogin):
     vendor = await db.vendors.find_one({"email": login_data.email})
-    if not vendor or not verify_password(login_data.senha, vendor["senha"]):
+    # Sempre verifica um hash para não revelar pelo tempo se o email existe
+    hashed = vendor["senha"] if vendor else _DUMMY_HASH
+    senha_ok = await asyncio.get_running_loop().run_in_executor(
+        None, verify_password, login_data.senha, hashed
+    )
+    if not vendor or not senha_ok:
         raise HTTPException(status_code=401, detail="Email ou senha inválidos")
     
     access_token = create_access_token(vendor["id"])
@@ -167,88 +412,164 @@ async def create_product(product_data: ProductCreate, current_vendor: dict = Dep
     product_dict["id"] = str(uuid.uuid4())
     product_dict["vendor_id"] = current_vendor["id"]
     product_dict["created_at"] = datetime.utcnow()
+    await store_product_image(product_dict, current_vendor["id"], product_dict["id"])
     
     await db.products.insert_one(product_dict)
+    invalidate_count_cache("products", current_vendor["id"])
+    invalidate_store_cache(current_vendor["nome_loja"])
     return Product(**product_dict)
 
 @api_router.get("/products/my")
 async def get_my_products(
     current_vendor: dict = Depends(get_current_vendor),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100)
+    cursor: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(20, ge=1, le=100),
+    exact_count: bool = Query(False)
 ):
-    total = await db.products.count_documents({"vendor_id": current_vendor["id"]})
-    products = await db.products.find({"vendor_id": current_vendor["id"]}).skip(skip).limit(limit).to_list(limit)
-    return {"total": total, "items": [Product(**product) for product in products]}
+    query = {"vendor_id": current_vendor["id"]}
+    find = db.products.find(keyset_query(query, cursor), PRODUCT_PROJECTION).sort(_KEYSET_SORT)
+    if not cursor and skip:
+        find = find.skip(skip)
+    # Busca limit+1 para saber se há próxima página; total e página em paralelo
+    total, products = await asyncio.gather(
+        count_for_vendor(db.products, current_vendor["id"], exact=exact_count),
+        find.limit(limit + 1).to_list(limit + 1)
+    )
+    has_more = len(products) > limit
+    products = products[:limit]
+    next_cursor = encode_cursor(products[-1]) if has_more else None
+    return {
+        "total": total,
+        # Documentos do banco já são confiáveis: sem revalidação
+        "items": [Product.model_construct(**product) for product in products],
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
 
 @api_router.put("/products/{product_id}")
 async def update_product(product_id: str, product_data: ProductCreate, current_vendor: dict = Depends(get_current_vendor)):
-    product = await db.products.find_one({"id": product_id, "vendor_id": current_vendor["id"]})
-    if not product:
+    product_dict = product_data.dict()
+    current = await db.products.find_one(
+        {"id": product_id, "vendor_id": current_vendor["id"]}, {"_id": 0, "imagem": 1, "imagem_url": 1}
+    )
+    if not current:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
-    
-    await db.products.update_one(
-        {"id": product_id}, 
-        {"$set": product_data.dict()}
+    imagem = product_dict.get("imagem")
+    if imagem and imagem in (current.get("imagem"), current.get("imagem_url")):
+        # O formulário reenvia a imagem já salva: mantém sem decodificar nem revalidar
+        product_dict["imagem"] = current.get("imagem")
+        product_dict["imagem_url"] = current.get("imagem_url")
+    else:
+        # A chave no object storage fica sob o vendor_id de quem chamou, então enviar antes é seguro
+        await store_product_image(product_dict, current_vendor["id"], product_id)
+    updated_product = await db.products.find_one_and_update(
+        {"id": product_id, "vendor_id": current_vendor["id"]},
+        {"$set": product_dict},
+        projection=PRODUCT_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
+    if not updated_product:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    invalidate_store_cache(current_vendor["nome_loja"])
     
-    updated_product = await db.products.find_one({"id": product_id})
     return Product(**updated_product)
 
+@api_router.post("/products/{product_id}/imagem")
+async def upload_product_image(
+    product_id: str,
+    imagem: UploadFile = File(...),
+    current_vendor: dict = Depends(get_current_vendor)
+):
+    # Lê um byte além do limite só para detectar arquivo grande demais sem carregar tudo
+    data = await imagem.read(MAX_IMAGE_BYTES + 1)
+    if s3 is not None:
+        update = {"imagem_url": await upload_image(current_vendor["id"], product_id, data), "imagem": None}
+    else:
+        # Sem limpar imagem_url o frontend continuaria mostrando a imagem antiga
+        update = {"imagem": image_data_url(data), "imagem_url": None}
+    product = await db.products.find_one_and_update(
+        {"id": product_id, "vendor_id": current_vendor["id"]},
+        {"$set": update},
+        projection=PRODUCT_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if not product:
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    invalidate_store_cache(current_vendor["nome_loja"])
+    
+    return Product(**product)
+
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, current_vendor: dict = Depends(get_current_vendor)):
     result = await db.products.delete_one({"id": product_id, "vendor_id": current_vendor["id"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
+    invalidate_count_cache("products", current_vendor["id"])
+    invalidate_store_cache(current_vendor["nome_loja"])
     
     return {"message": "Produto excluído com sucesso"}
 
 # Public store routes
-@api_router.get("/stores/all")
-async def get_all_stores():
-    """Get all stores with basic info for homepage"""
+async def _fetch_all_stores():
     try:
-        # Get all vendors
-        vendors = await db.vendors.find({}).to_list(1000)
-        
-        stores = []
-        for vendor in vendors:
-            # Count products for each vendor
-            product_count = await db.products.count_documents({
-                "vendor_id": vendor["id"],
-                "quantidade": {"$gt": 0}
-            })
-            
-            store_info = {
-                "id": vendor["id"],
-                "nome": vendor["nome"],
-                "nome_loja": vendor["nome_loja"],
-                "telefone": vendor["telefone"],
-                "product_count": product_count,
-                "created_at": vendor["created_at"]
-            }
-            stores.append(store_info)
-        
-        # Sort by creation date (newest first)
-        stores.sort(key=lambda x: x["created_at"], reverse=True)
+        # Uma única agregação: contagem de produtos em estoque via $lookup
+        stores = await db.vendors.aggregate([
+            # Sort by creation date (newest first); ordenar/limitar antes do $lookup
+            # faz só as lojas retornadas pagarem pela contagem
+            {"$sort": {"created_at": -1}},
+            {"$limit": 1000},
+            {"$lookup": {
+                "from": "products",
+                "let": {"vid": "$id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$and": [
+                        {"$eq": ["$vendor_id", "$$vid"]},
+                        {"$gt": ["$quantidade", 0]}
+                    ]}}},
+                    {"$count": "n"}
+                ],
+                "as": "pc"
+            }},
+            {"$addFields": {"product_count": {"$ifNull": [{"$arrayElemAt": ["$pc.n", 0]}, 0]}}},
+            {"$project": {
+                "_id": 0,
+                "id": 1,
+                "nome": 1,
+                "nome_loja": 1,
+                "telefone": 1,
+                "product_count": 1,
+                "created_at": 1
+            }}
+        ]).to_list(None)
         return stores
         
     except Exception as e:
         raise HTTPException(status_code=500, detail="Erro ao buscar lojas")
 
-@api_router.get("/loja/{nome_loja}")
-async def get_store(nome_loja: str):
+async def _fetch_store(nome_loja: str):
     vendor = await db.vendors.find_one({"nome_loja": nome_loja})
     if not vendor:
         raise HTTPException(status_code=404, detail="Loja não encontrada")
     
-    products = await db.products.find({"vendor_id": vendor["id"], "quantidade": {"$gt": 0}}).to_list(1000)
+    products = await db.products.find(
+        {"vendor_id": vendor["id"], "quantidade": {"$gt": 0}}, PRODUCT_PROJECTION
+    ).to_list(1000)
     
     return {
         "vendor": VendorResponse(**vendor),
-        "products": [Product(**product) for product in products]
+        "products": [Product.model_construct(**product) for product in products]
     }
 
+@api_router.get("/stores/all")
+async def get_all_stores(request: Request):
+    """Get all stores with basic info for homepage"""
+    return await cached_public_response(request, "stores:all", _fetch_all_stores)
+
+@api_router.get("/loja/{nome_loja}")
+async def get_store(nome_loja: str, request: Request):
+    return await cached_public_response(request, f"store:{nome_loja}", lambda: _fetch_store(nome_loja))
+
 @api_router.get("/categorias/{nome_loja}")
 async def get_store_categories(nome_loja: str):
     vendor = await db.vendors.find_one({"nome_loja": nome_loja})
@@ -261,37 +582,127 @@ async def get_store_categories(nome_loja: str):
 # Order routes
 @api_router.post("/orders")
 async def create_order(order_data: OrderCreate):
-    # Verificar e atualizar estoque
-    for item in order_data.items:
-        product = await db.products.find_one({"id": item["product_id"]})
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Produto {item['nome']} não encontrado")
-        if product["quantidade"] < item["quantidade"]:
-            raise HTTPException(status_code=400, detail=f"Estoque insuficiente para o produto {item['nome']}")
-    # Se tudo ok, decrementar estoque
+    # Quantidade total pedida por produto
+    quantidades = {}
+    nomes = {}
     for item in order_data.items:
-        await db.products.update_one(
-            {"id": item["product_id"]},
-            {"$inc": {"quantidade": -item["quantidade"]}}
-        )
+        # Quantidade negativa passaria no $gte e aumentaria o estoque
+        if not isinstance(item.get("quantidade"), int) or item["quantidade"] <= 0:
+            raise HTTPException(status_code=400, detail=f"Quantidade inválida para o produto {item.get('nome')}")
+        quantidades[item["product_id"]] = quantidades.get(item["product_id"], 0) + item["quantidade"]
+        nomes.setdefault(item["product_id"], item["nome"])
+    
     # Calculate total
     total = sum(item["preco"] * item["quantidade"] for item in order_data.items)
     order_dict = order_data.dict()
     order_dict["id"] = str(uuid.uuid4())
     order_dict["total"] = total
     order_dict["created_at"] = datetime.utcnow()
-    await db.orders.insert_one(order_dict)
+    
+    async def buscar_estoque(session=None):
+        # Verificar estoque com uma única consulta
+        return {
+            product["id"]: product
+            async for product in db.products.find(
+                {"id": {"$in": list(quantidades)}}, {"_id": 0, "id": 1, "quantidade": 1}, session=session
+            )
+        }
+    
+    def validar_estoque(products):
+        for product_id, quantidade in quantidades.items():
+            product = products.get(product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail=f"Produto {nomes[product_id]} não encontrado")
+            if product["quantidade"] < quantidade:
+                raise HTTPException(status_code=400, detail=f"Estoque insuficiente para o produto {nomes[product_id]}")
+    
+    # Decremento condicional ($gte) evita vender além do estoque em pedidos concorrentes
+    if _supports_transactions:
+        ops = [
+            UpdateOne({"id": product_id, "quantidade": {"$gte": quantidade}}, {"$inc": {"quantidade": -quantidade}})
+            for product_id, quantidade in quantidades.items()
+        ]
+        
+        async def reservar_estoque(session):
+            # Pode rodar mais de uma vez: with_transaction repete em WriteConflict
+            products = await buscar_estoque(session)
+            validar_estoque(products)
+            result = await db.products.bulk_write(ops, ordered=False, session=session)
+            # matched_count: o filtro $gte valeu para todos os itens
+            if result.matched_count != len(ops):
+                # Produtos cujo estoque não foi decrementado nesta transação
+                atual = await buscar_estoque(session)
+                falhas = [
+                    pid for pid in quantidades
+                    if atual.get(pid, {}).get("quantidade") == products[pid]["quantidade"]
+                ] or list(quantidades)
+                raise HTTPException(status_code=400, detail=f"Estoque insuficiente para o produto {nomes[falhas[0]]}")
+            await db.orders.insert_one(order_dict, session=session)
+        
+        try:
+            async with await client.start_session() as session:
+                await session.with_transaction(reservar_estoque)
+        except PyMongoError as exc:
+            # Conflitos com pedidos concorrentes persistiram após as tentativas: não é falta de estoque
+            if exc.has_error_label("TransientTransactionError"):
+                raise HTTPException(status_code=409, detail="Muitos pedidos simultâneos, tente novamente")
+            raise
+    else:
+        validar_estoque(await buscar_estoque())
+        # Sem replica set: updates concorrentes para saber qual falhou e compensar
+        results = await asyncio.gather(*[
+            db.products.update_one(
+                {"id": product_id, "quantidade": {"$gte": quantidade}},
+                {"$inc": {"quantidade": -quantidade}}
+            )
+            for product_id, quantidade in quantidades.items()
+        ])
+        falhas = [pid for pid, r in zip(quantidades, results) if r.matched_count == 0]
+        if falhas:
+            sucesso = [pid for pid, r in zip(quantidades, results) if r.matched_count == 1]
+            if sucesso:
+                await db.products.bulk_write(
+                    [UpdateOne({"id": pid}, {"$inc": {"quantidade": quantidades[pid]}}) for pid in sucesso],
+                    ordered=False
+                )
+            raise HTTPException(status_code=400, detail=f"Estoque insuficiente para o produto {nomes[falhas[0]]}")
+        await db.orders.insert_one(order_dict)
+    invalidate_count_cache("orders", order_dict["vendor_id"])
+    _dashboard_cache.pop(order_dict["vendor_id"], None)
+    # Estoque mudou: a vitrine da loja também sai do cache, senão mostra produtos já esgotados
+    vendor = await db.vendors.find_one({"id": order_dict["vendor_id"]}, {"_id": 0, "nome_loja": 1})
+    if vendor:
+        invalidate_store_cache(vendor["nome_loja"])
+    else:
+        _public_cache.pop("stores:all", None)
     return Order(**order_dict)
 
 @api_router.get("/orders/my")
 async def get_my_orders(
     current_vendor: dict = Depends(get_current_vendor),
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100)
+    cursor: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(20, ge=1, le=100),
+    exact_count: bool = Query(False)
 ):
-    total = await db.orders.count_documents({"vendor_id": current_vendor["id"]})
-    orders = await db.orders.find({"vendor_id": current_vendor["id"]}).skip(skip).limit(limit).to_list(limit)
-    return {"total": total, "items": [Order(**order) for order in orders]}
+    query = {"vendor_id": current_vendor["id"]}
+    find = db.orders.find(keyset_query(query, cursor), ORDER_PROJECTION).sort(_KEYSET_SORT)
+    if not cursor and skip:
+        find = find.skip(skip)
+    # Busca limit+1 para saber se há próxima página; total e página em paralelo
+    total, orders = await asyncio.gather(
+        count_for_vendor(db.orders, current_vendor["id"], exact=exact_count),
+        find.limit(limit + 1).to_list(limit + 1)
+    )
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = encode_cursor(orders[-1]) if has_more else None
+    return {
+        "total": total,
+        "items": [Order.model_construct(**order) for order in orders],
+        "has_more": has_more,
+        "next_cursor": next_cursor
+    }
 
 @api_router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status: dict, current_vendor: dict = Depends(get_current_vendor)):
@@ -307,40 +718,49 @@ async def update_order_status(order_id: str, status: dict, current_vendor: dict
 
 @api_router.get("/dashboard")
 async def get_dashboard(current_vendor: dict = Depends(get_current_vendor)):
-    from collections import Counter, defaultdict
-    import pytz
-    
-    # Buscar todos os pedidos do vendedor
-    orders = await db.orders.find({"vendor_id": current_vendor["id"]}).to_list(1000)
+    dashboard = _dashboard_cache.get(current_vendor["id"])
+    if dashboard is not None:
+        return dashboard
     
-    total_vendas = sum(order.get("total", 0) for order in orders)
-    quantidade_pedidos = len(orders)
+    # Todas as métricas calculadas no MongoDB em uma única agregação
+    pipeline = [
+        {"$match": {"vendor_id": current_vendor["id"]}},
+        {"$facet": {
+            "totais": [
+                {"$group": {"_id": None, "total_vendas": {"$sum": "$total"}, "quantidade_pedidos": {"$sum": 1}}}
+            ],
+            # Produtos mais vendidos
+            "produtos_mais_vendidos": [
+                {"$unwind": "$items"},
+                {"$group": {"_id": "$items.nome", "quantidade": {"$sum": "$items.quantidade"}}},
+                {"$sort": {"quantidade": -1}},
+                {"$limit": 5}
+            ],
+            # Vendas por dia, no fuso horário do Brasil
+            "vendas_por_dia": [
+                {"$group": {
+                    "_id": {"$dateToString": {
+                        "format": "%Y-%m-%d",
+                        "date": {"$toDate": "$created_at"},
+                        "timezone": BR_TIMEZONE
+                    }},
+                    "total": {"$sum": "$total"}
+                }},
+                {"$sort": {"_id": 1}}
+            ]
+        }}
+    ]
+    result = (await db.orders.aggregate(pipeline).to_list(1))[0]
+    totais = result["totais"][0] if result["totais"] else {}
     
-    # Produtos mais vendidos
-    produtos_counter = Counter()
-    for order in orders:
-        for item in order.get("items", []):
-            produtos_counter[item["nome"]] += item["quantidade"]
-    produtos_mais_vendidos = produtos_counter.most_common(5)
-    
-    # Vendas por dia
-    vendas_por_dia = defaultdict(float)
-    for order in orders:
-        dt = order.get("created_at")
-        if isinstance(dt, str):
-            dt = datetime.fromisoformat(dt)
-        # Ajustar para o fuso horário do Brasil
-        dt = dt.astimezone(pytz.timezone("America/Sao_Paulo"))
-        dia = dt.strftime("%Y-%m-%d")
-        vendas_por_dia[dia] += order.get("total", 0)
-    vendas_por_dia = dict(sorted(vendas_por_dia.items()))
-    
-    return {
-        "total_vendas": total_vendas,
-        "quantidade_pedidos": quantidade_pedidos,
-        "produtos_mais_vendidos": produtos_mais_vendidos,
-        "vendas_por_dia": vendas_por_dia
+    dashboard = {
+        "total_vendas": totais.get("total_vendas", 0),
+        "quantidade_pedidos": totais.get("quantidade_pedidos", 0),
+        "produtos_mais_vendidos": [[p["_id"], p["quantidade"]] for p in result["produtos_mais_vendidos"]],
+        "vendas_por_dia": {d["_id"]: d["total"] for d in result["vendas_por_dia"]}
     }
+    _dashboard_cache[current_vendor["id"]] = dashboard
+    return dashboard
 
 # Health check
 @api_router.get("/")
@@ -372,6 +792,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Login, cadastro e página pública da loja
+    await db.vendors.create_index("id", unique=True)
+    # O cadastro antigo não garantia unicidade: bases existentes podem ter duplicados e
+    # isso não deve impedir o boot (dedupe_vendors.py resolve e cria o índice)
+    for field in ("email", "nome_loja"):
+        try:
+            await db.vendors.create_index(field, unique=True)
+        except DuplicateKeyError:
+            logger.error("Índice único vendors.%s não criado: há duplicados; rode dedupe_vendors.py", field)
+    await db.products.create_index("id", unique=True)
+    await db.orders.create_index("id", unique=True)
+    # /stores/all: $sort + $limit no início da agregação
+    await db.vendors.create_index([("created_at", -1)])
+    # /stores/all e /loja/{nome_loja} (produtos com estoque)
+    await db.products.create_index([("vendor_id", 1), ("quantidade", 1)])
+    # distinct coberto pelo índice em /categorias/{nome_loja}
+    await db.products.create_index([("vendor_id", 1), ("categoria", 1)], name="vendor_cat")
+    # Paginação por cursor em /products/my e /orders/my (também cobre vendor_id, created_at)
+    await db.products.create_index([("vendor_id", 1), ("created_at", -1), ("id", -1)])
+    await db.orders.create_index([("vendor_id", 1), ("created_at", -1), ("id", -1)])
+
+@app.on_event("startup")
+async def detect_transaction_support():
+    global _supports_transactions
+    hello = await client.admin.command("hello")
+    _supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
@@ -4,28 +4,75 @@ Comprehensive Backend Testing for Brazilian Feirantes Marketplace
 Tests all backend APIs including authentication, products, orders, and public store endpoints.
 """
 
-import requests
-import json
+import asyncio
+import sys
+import aiohttp
+from yarl import URL
+import orjson
+import numpy as np
 import base64
-from datetime import datetime
-import uuid
+from collections import Counter
+import secrets
 
 # Backend URL from frontend .env
 BASE_URL = "https://4f3c215f-f42f-46ba-9a44-ee92c471daf5.preview.emergentagent.com/api"
 
+# Simple 1x1 pixel PNG: as a data URL in the JSON body (what the frontend sends on create/update)
+# and decoded once to raw bytes for the multipart upload
+SAMPLE_IMAGE_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+SAMPLE_IMAGE_DATA_URL = f"data:image/png;base64,{SAMPLE_IMAGE_B64}"
+SAMPLE_IMAGE_BYTES = base64.b64decode(SAMPLE_IMAGE_B64)
+
+def _check(response, expected=200):
+    """Status-only check; the body is read later and only if needed"""
+    return response.status == expected
+
+async def _json(response):
+    """Decode a response body with orjson instead of the stdlib json module"""
+    body = await response.read()
+    return orjson.loads(body) if body else {}
+
+def _dumps(payload):
+    """ClientSession json_serialize hook: every json= body goes through orjson while aiohttp
+    still sets Content-Type, so call sites stay json=...; aiohttp expects a str, hence decode()"""
+    return orjson.dumps(payload).decode()
+
 class FeirantesAPITester:
     def __init__(self):
         self.base_url = BASE_URL
+        # Fixed endpoint URLs parsed once; parameterized ones are a single prefix + id concat
+        self._url_products_my = URL(f"{self.base_url}/products/my")
+        self._url_orders_my = URL(f"{self.base_url}/orders/my")
+        self._products_prefix = f"{self.base_url}/products/"
+        self._orders_prefix = f"{self.base_url}/orders/"
         self.access_token = None
         self.vendor_id = None
         self.product_id = None
         self.order_id = None
         self.test_results = []
+        self.session = None
+        self.verbose = "-v" in sys.argv
+        # Registration already yields a working token; --full also re-checks it via /auth/login
+        self.full_mode = "--full" in sys.argv
+        self._output = []
         
+    def log(self, line):
+        """Print immediately in verbose mode, otherwise buffer until flush_output"""
+        if self.verbose:
+            print(line)
+        else:
+            self._output.append(line)
+    
+    def flush_output(self):
+        """Write all buffered lines with a single stdout write"""
+        if self._output:
+            sys.stdout.write("\n".join(self._output) + "\n")
+            self._output = []
+    
     def log_test(self, test_name, success, message="", response_data=None):
         """Log test results"""
         status = "✅ PASS" if success else "❌ FAIL"
-        print(f"{status} {test_name}: {message}")
+        self.log(f"{status} {test_name}: {message}")
         self.test_results.append({
             "test": test_name,
             "success": success,
@@ -33,54 +80,56 @@ class FeirantesAPITester:
             "response_data": response_data
         })
         
-    def test_health_check(self):
+    async def test_health_check(self):
         """Test basic API health check"""
         try:
-            response = requests.get(f"{self.base_url}/")
-            if response.status_code == 200:
-                data = response.json()
-                self.log_test("Health Check", True, f"API is running: {data.get('message', '')}")
-                return True
-            else:
-                self.log_test("Health Check", False, f"Status code: {response.status_code}")
-                return False
+            async with self.session.get(f"{self.base_url}/") as response:
+                if _check(response):
+                    data = await _json(response)
+                    self.log_test("Health Check", True, f"API is running: {data.get('message', '')}")
+                    return True
+                else:
+                    self.log_test("Health Check", False, f"Status code: {response.status}")
+                    return False
         except Exception as e:
             self.log_test("Health Check", False, f"Connection error: {str(e)}")
             return False
     
-    def test_vendor_registration(self):
+    async def test_vendor_registration(self):
         """Test vendor registration"""
+        suffix = secrets.token_hex(7)  # 14 hex chars: 8 for the email, 6 for the store
         vendor_data = {
             "nome": "Maria Silva",
-            "email": f"maria.silva.{uuid.uuid4().hex[:8]}@email.com",
+            "email": f"maria.silva.{suffix[:8]}@email.com",
             "telefone": "(11) 98765-4321",
             "senha": "senha123",
-            "nome_loja": f"Feira_da_Maria_{uuid.uuid4().hex[:6]}"
+            "nome_loja": f"Feira_da_Maria_{suffix[8:]}"
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/register", json=vendor_data)
-            if response.status_code == 200:
-                data = response.json()
-                self.access_token = data.get("access_token")
-                vendor = data.get("vendor", {})
-                self.vendor_id = vendor.get("id")
-                self.vendor_email = vendor_data["email"]
-                self.vendor_password = vendor_data["senha"]
-                self.vendor_loja = vendor_data["nome_loja"]
-                
-                self.log_test("Vendor Registration", True, 
-                            f"Vendor registered successfully. ID: {self.vendor_id}")
-                return True
-            else:
-                self.log_test("Vendor Registration", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
+            async with self.session.post(f"{self.base_url}/auth/register", json=vendor_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    self.access_token = data.get("access_token")
+                    self.session.headers["Authorization"] = f"Bearer {self.access_token}"
+                    vendor = data.get("vendor", {})
+                    self.vendor_id = vendor.get("id")
+                    self.vendor_email = vendor_data["email"]
+                    self.vendor_password = vendor_data["senha"]
+                    self.vendor_loja = vendor_data["nome_loja"]
+                    
+                    self.log_test("Vendor Registration", True, 
+                                f"Vendor registered successfully. ID: {self.vendor_id}")
+                    return True
+                else:
+                    self.log_test("Vendor Registration", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
+                    return False
         except Exception as e:
             self.log_test("Vendor Registration", False, f"Error: {str(e)}")
             return False
     
-    def test_vendor_login(self):
+    async def test_vendor_login(self):
         """Test vendor login"""
         if not hasattr(self, 'vendor_email'):
             self.log_test("Vendor Login", False, "No registered vendor to test login")
@@ -92,27 +141,27 @@ class FeirantesAPITester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/login", json=login_data)
-            if response.status_code == 200:
-                data = response.json()
-                token = data.get("access_token")
-                vendor = data.get("vendor", {})
-                
-                if token and vendor.get("id") == self.vendor_id:
-                    self.log_test("Vendor Login", True, "Login successful with valid token")
-                    return True
+            async with self.session.post(f"{self.base_url}/auth/login", json=login_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    token = data.get("access_token")
+                    vendor = data.get("vendor", {})
+                    
+                    if token and vendor.get("id") == self.vendor_id:
+                        self.log_test("Vendor Login", True, "Login successful with valid token")
+                        return True
+                    else:
+                        self.log_test("Vendor Login", False, "Invalid response structure")
+                        return False
                 else:
-                    self.log_test("Vendor Login", False, "Invalid response structure")
+                    self.log_test("Vendor Login", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Vendor Login", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Vendor Login", False, f"Error: {str(e)}")
             return False
     
-    def test_invalid_login(self):
+    async def test_invalid_login(self):
         """Test login with invalid credentials"""
         login_data = {
             "email": "invalid@email.com",
@@ -120,83 +169,158 @@ class FeirantesAPITester:
         }
         
         try:
-            response = requests.post(f"{self.base_url}/auth/login", json=login_data)
-            if response.status_code == 401:
-                self.log_test("Invalid Login", True, "Correctly rejected invalid credentials")
-                return True
-            else:
-                self.log_test("Invalid Login", False, 
-                            f"Expected 401, got {response.status_code}")
-                return False
+            async with self.session.post(f"{self.base_url}/auth/login", json=login_data) as response:
+                if _check(response, 401):
+                    self.log_test("Invalid Login", True, "Correctly rejected invalid credentials")
+                    return True
+                else:
+                    self.log_test("Invalid Login", False, 
+                                f"Expected 401, got {response.status}")
+                    return False
         except Exception as e:
             self.log_test("Invalid Login", False, f"Error: {str(e)}")
             return False
     
-    def test_create_product(self):
+    async def test_create_product(self):
         """Test product creation with authentication"""
         if not self.access_token:
             self.log_test("Create Product", False, "No access token available")
             return False
             
-        # Create a simple base64 image (1x1 pixel PNG)
-        sample_image = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
-        
         product_data = {
             "nome": "Tomate Orgânico",
             "descricao": "Tomates frescos e orgânicos direto da fazenda",
             "preco": 8.50,
             "quantidade": 25,
             "categoria": "Verduras e Legumes",
-            "imagem": sample_image
+            "imagem": SAMPLE_IMAGE_DATA_URL
         }
         
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.post(f"{self.base_url}/products", 
-                                   json=product_data, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                self.product_id = data.get("id")
-                self.log_test("Create Product", True, 
-                            f"Product created successfully. ID: {self.product_id}")
-                return True
-            else:
-                self.log_test("Create Product", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
+            async with self.session.post(f"{self.base_url}/products", json=product_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    self.product_id = data.get("id")
+                    if data.get("imagem_url") or data.get("imagem"):
+                        self.log_test("Create Product", True, 
+                                    f"Product created successfully. ID: {self.product_id}")
+                        return True
+                    else:
+                        self.log_test("Create Product", False, "Product has no image after create")
+                        return False
+                else:
+                    self.log_test("Create Product", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
+                    return False
         except Exception as e:
             self.log_test("Create Product", False, f"Error: {str(e)}")
             return False
     
-    def test_get_my_products(self):
+    async def test_upload_product_image(self):
+        """Test multipart product image upload"""
+        if not self.access_token or not self.product_id:
+            self.log_test("Upload Product Image", False, "No access token or product ID available")
+            return False
+        
+        form = aiohttp.FormData()
+        form.add_field("imagem", SAMPLE_IMAGE_BYTES, filename="sample.png", content_type="image/png")
+        
+        try:
+            async with self.session.post(self._products_prefix + self.product_id + "/imagem", data=form) as response:
+                if _check(response):
+                    data = await _json(response)
+                    if data.get("imagem_url") or data.get("imagem"):
+                        self.log_test("Upload Product Image", True, "Product image uploaded successfully")
+                        return True
+                    else:
+                        self.log_test("Upload Product Image", False, "Product has no image after upload")
+                        return False
+                else:
+                    self.log_test("Upload Product Image", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
+                    return False
+        except Exception as e:
+            self.log_test("Upload Product Image", False, f"Error: {str(e)}")
+            return False
+    
+    async def test_get_my_products(self):
         """Test getting vendor's products"""
         if not self.access_token:
             self.log_test("Get My Products", False, "No access token available")
             return False
             
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.get(f"{self.base_url}/products/my", headers=headers)
-            if response.status_code == 200:
-                products = response.json()
-                if isinstance(products, list) and len(products) > 0:
-                    self.log_test("Get My Products", True, 
-                                f"Retrieved {len(products)} products")
-                    return True
+            async with self.session.get(self._url_products_my) as response:
+                if _check(response):
+                    products = (await _json(response)).get("items")
+                    if isinstance(products, list) and len(products) > 0:
+                        self.log_test("Get My Products", True, 
+                                    f"Retrieved {len(products)} products")
+                        return True
+                    else:
+                        self.log_test("Get My Products", True, "No products found (empty list)")
+                        return True
                 else:
-                    self.log_test("Get My Products", True, "No products found (empty list)")
-                    return True
+                    self.log_test("Get My Products", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
+                    return False
+        except Exception as e:
+            self.log_test("Get My Products", False, f"Error: {str(e)}")
+            return False
+    
+    async def test_products_pagination(self):
+        """Test cursor pagination: page 1 reports has_more/next_cursor, page 2 follows the cursor"""
+        if not self.access_token or not self.product_id:
+            self.log_test("Products Pagination", False, "No access token or product ID available")
+            return False
+        
+        # A second product guarantees two pages with limit=1
+        product_data = {
+            "nome": "Alface Crespa",
+            "descricao": "Alface fresca colhida no dia",
+            "preco": 3.50,
+            "quantidade": 10,
+            "categoria": "Verduras e Legumes"
+        }
+        
+        extra_id = None
+        try:
+            async with self.session.post(f"{self.base_url}/products", json=product_data) as response:
+                if not _check(response):
+                    self.log_test("Products Pagination", False,
+                                f"Could not create second product. Status: {response.status}")
+                    return False
+                extra_id = (await _json(response)).get("id")
+            
+            async with self.session.get(self._url_products_my, params={"limit": 1}) as response:
+                page1 = await _json(response)
+                if not _check(response) or not page1.get("has_more") or not page1.get("next_cursor"):
+                    self.log_test("Products Pagination", False,
+                                f"Page 1 missing has_more/next_cursor. Status: {response.status}, Response: {page1}")
+                    return False
+            
+            async with self.session.get(
+                self._url_products_my, params={"limit": 1, "cursor": page1["next_cursor"]}
+            ) as response:
+                page2 = await _json(response)
+            page1_ids = {item["id"] for item in page1.get("items", [])}
+            page2_ids = {item["id"] for item in page2.get("items", [])}
+            if _check(response) and len(page2_ids) == 1 and not page1_ids & page2_ids:
+                self.log_test("Products Pagination", True, "Cursor led to a distinct second page")
+                return True
             else:
-                self.log_test("Get My Products", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
+                self.log_test("Products Pagination", False,
+                            f"Page 2 invalid. Status: {response.status}, Response: {page2}")
                 return False
         except Exception as e:
-            self.log_test("Get My Products", False, f"Error: {str(e)}")
+            self.log_test("Products Pagination", False, f"Error: {str(e)}")
             return False
+        finally:
+            if extra_id:
+                async with self.session.delete(self._products_prefix + extra_id):
+                    pass
     
-    def test_update_product(self):
+    async def test_update_product(self):
         """Test product update"""
         if not self.access_token or not self.product_id:
             self.log_test("Update Product", False, "No access token or product ID available")
@@ -211,88 +335,120 @@ class FeirantesAPITester:
             "imagem": None
         }
         
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.put(f"{self.base_url}/products/{self.product_id}", 
-                                  json=updated_data, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("nome") == updated_data["nome"] and data.get("preco") == updated_data["preco"]:
-                    self.log_test("Update Product", True, "Product updated successfully")
-                    return True
+            async with self.session.put(self._products_prefix + self.product_id, json=updated_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    if data.get("nome") == updated_data["nome"] and data.get("preco") == updated_data["preco"]:
+                        self.log_test("Update Product", True, "Product updated successfully")
+                        return True
+                    else:
+                        self.log_test("Update Product", False, "Product data not updated correctly")
+                        return False
                 else:
-                    self.log_test("Update Product", False, "Product data not updated correctly")
+                    self.log_test("Update Product", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Update Product", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Update Product", False, f"Error: {str(e)}")
             return False
     
-    def test_public_store(self):
+    async def test_public_store(self):
         """Test public store endpoint"""
         if not hasattr(self, 'vendor_loja'):
             self.log_test("Public Store", False, "No store name available")
             return False
             
         try:
-            response = requests.get(f"{self.base_url}/loja/{self.vendor_loja}")
-            if response.status_code == 200:
-                data = response.json()
-                vendor = data.get("vendor", {})
-                products = data.get("products", [])
-                
-                if vendor.get("id") == self.vendor_id and isinstance(products, list):
-                    self.log_test("Public Store", True, 
-                                f"Store retrieved with {len(products)} products")
-                    return True
+            async with self.session.get(f"{self.base_url}/loja/{self.vendor_loja}") as response:
+                if _check(response):
+                    data = await _json(response)
+                    vendor = data.get("vendor", {})
+                    products = data.get("products", [])
+                    
+                    if vendor.get("id") == self.vendor_id and isinstance(products, list):
+                        self.log_test("Public Store", True, 
+                                    f"Store retrieved with {len(products)} products")
+                        return True
+                    else:
+                        self.log_test("Public Store", False, "Invalid store data structure")
+                        return False
                 else:
-                    self.log_test("Public Store", False, "Invalid store data structure")
+                    self.log_test("Public Store", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
+        except Exception as e:
+            self.log_test("Public Store", False, f"Error: {str(e)}")
+            return False
+    
+    async def test_public_store_etag(self):
+        """Test that a repeated store request with If-None-Match gets 304 Not Modified"""
+        if not hasattr(self, 'vendor_loja'):
+            self.log_test("Public Store ETag", False, "No store name available")
+            return False
+            
+        url = f"{self.base_url}/loja/{self.vendor_loja}"
+        try:
+            async with self.session.get(url) as response:
+                etag = response.headers.get("ETag")
+            if not _check(response) or not etag:
+                self.log_test("Public Store ETag", False, 
+                            f"Missing ETag. Status: {response.status}")
+                return False
+            
+            async with self.session.get(url, headers={"If-None-Match": etag}) as response:
+                pass
+            if _check(response, 304):
+                self.log_test("Public Store ETag", True, "Conditional request returned 304")
+                return True
             else:
-                self.log_test("Public Store", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
+                self.log_test("Public Store ETag", False, 
+                            f"Expected 304, got {response.status}")
                 return False
         except Exception as e:
-            self.log_test("Public Store", False, f"Error: {str(e)}")
+            self.log_test("Public Store ETag", False, f"Error: {str(e)}")
             return False
     
-    def test_store_categories(self):
+    async def test_store_categories(self):
         """Test store categories endpoint"""
         if not hasattr(self, 'vendor_loja'):
             self.log_test("Store Categories", False, "No store name available")
             return False
             
         try:
-            response = requests.get(f"{self.base_url}/categorias/{self.vendor_loja}")
-            if response.status_code == 200:
-                data = response.json()
-                categories = data.get("categorias", [])
-                
-                if isinstance(categories, list):
-                    self.log_test("Store Categories", True, 
-                                f"Retrieved {len(categories)} categories")
-                    return True
+            async with self.session.get(f"{self.base_url}/categorias/{self.vendor_loja}") as response:
+                if _check(response):
+                    data = await _json(response)
+                    categories = data.get("categorias", [])
+                    
+                    if isinstance(categories, list):
+                        self.log_test("Store Categories", True, 
+                                    f"Retrieved {len(categories)} categories")
+                        return True
+                    else:
+                        self.log_test("Store Categories", False, "Invalid categories data")
+                        return False
                 else:
-                    self.log_test("Store Categories", False, "Invalid categories data")
+                    self.log_test("Store Categories", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Store Categories", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Store Categories", False, f"Error: {str(e)}")
             return False
     
-    def test_create_order(self):
+    async def test_create_order(self):
         """Test order creation"""
         if not self.vendor_id or not self.product_id:
             self.log_test("Create Order", False, "No vendor ID or product ID available")
             return False
             
+        # Order lines as parallel arrays; extend these to test multi-item orders
+        product_ids = [self.product_id]
+        names = ["Tomate Orgânico Premium"]
+        prices = np.array([12.00], dtype=np.float64)
+        qtys = np.array([3], dtype=np.int32)
+        expected_total = float(prices @ qtys)  # 36.00
+        
         order_data = {
             "vendor_id": self.vendor_id,
             "cliente_nome": "João Santos",
@@ -300,203 +456,274 @@ class FeirantesAPITester:
             "cliente_endereco": "Rua das Flores, 123 - São Paulo, SP",
             "observacoes": "Entregar pela manhã, por favor",
             "items": [
-                {
-                    "product_id": self.product_id,
-                    "nome": "Tomate Orgânico Premium",
-                    "preco": 12.00,
-                    "quantidade": 3
-                }
+                {"product_id": product_id, "nome": nome, "preco": preco, "quantidade": quantidade}
+                for product_id, nome, preco, quantidade in zip(product_ids, names, prices.tolist(), qtys.tolist())
             ]
         }
         
         try:
-            response = requests.post(f"{self.base_url}/orders", json=order_data)
-            if response.status_code == 200:
-                data = response.json()
-                self.order_id = data.get("id")
-                total = data.get("total")
-                expected_total = 12.00 * 3  # 36.00
-                
-                if abs(total - expected_total) < 0.01:  # Allow for floating point precision
-                    self.log_test("Create Order", True, 
-                                f"Order created successfully. ID: {self.order_id}, Total: R$ {total}")
-                    return True
+            async with self.session.post(f"{self.base_url}/orders", json=order_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    self.order_id = data.get("id")
+                    total = data.get("total")
+                    
+                    if np.isclose(total, expected_total, atol=0.01):  # Allow for floating point precision
+                        self.log_test("Create Order", True, 
+                                    f"Order created successfully. ID: {self.order_id}, Total: R$ {total}")
+                        return True
+                    else:
+                        self.log_test("Create Order", False, 
+                                    f"Total calculation incorrect. Expected: {expected_total}, Got: {total}")
+                        return False
                 else:
                     self.log_test("Create Order", False, 
-                                f"Total calculation incorrect. Expected: {expected_total}, Got: {total}")
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
+        except Exception as e:
+            self.log_test("Create Order", False, f"Error: {str(e)}")
+            return False
+    
+    async def _product_stock(self):
+        """Current stock of the test product, read from /products/my"""
+        async with self.session.get(self._url_products_my, params={"limit": 100}) as response:
+            items = (await _json(response)).get("items", [])
+            return next((item["quantidade"] for item in items if item["id"] == self.product_id), None)
+    
+    async def test_order_exceeding_stock(self):
+        """Test that ordering more than the stock is rejected and leaves the stock untouched"""
+        if not self.vendor_id or not self.product_id:
+            self.log_test("Order Exceeding Stock", False, "No vendor ID or product ID available")
+            return False
+            
+        try:
+            stock_before = await self._product_stock()
+            order_data = {
+                "vendor_id": self.vendor_id,
+                "cliente_nome": "João Santos",
+                "cliente_telefone": "(11) 99999-8888",
+                "cliente_endereco": "Rua das Flores, 123 - São Paulo, SP",
+                "items": [{
+                    "product_id": self.product_id,
+                    "nome": "Tomate Orgânico Premium",
+                    "preco": 12.00,
+                    "quantidade": (stock_before or 0) + 1
+                }]
+            }
+            async with self.session.post(f"{self.base_url}/orders", json=order_data) as response:
+                pass
+            stock_after = await self._product_stock()
+            
+            if _check(response, 400) and stock_before is not None and stock_after == stock_before:
+                self.log_test("Order Exceeding Stock", True, 
+                            f"Rejected with 400, stock unchanged at {stock_after}")
+                return True
             else:
-                self.log_test("Create Order", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
+                self.log_test("Order Exceeding Stock", False, 
+                            f"Expected 400 and stock {stock_before}, got {response.status} and stock {stock_after}")
                 return False
         except Exception as e:
-            self.log_test("Create Order", False, f"Error: {str(e)}")
+            self.log_test("Order Exceeding Stock", False, f"Error: {str(e)}")
             return False
     
-    def test_get_my_orders(self):
+    async def test_get_my_orders(self):
         """Test getting vendor's orders"""
         if not self.access_token:
             self.log_test("Get My Orders", False, "No access token available")
             return False
             
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.get(f"{self.base_url}/orders/my", headers=headers)
-            if response.status_code == 200:
-                orders = response.json()
-                if isinstance(orders, list):
-                    self.log_test("Get My Orders", True, 
-                                f"Retrieved {len(orders)} orders")
-                    return True
+            async with self.session.get(self._url_orders_my) as response:
+                if _check(response):
+                    orders = (await _json(response)).get("items")
+                    if isinstance(orders, list):
+                        self.log_test("Get My Orders", True, 
+                                    f"Retrieved {len(orders)} orders")
+                        return True
+                    else:
+                        self.log_test("Get My Orders", False, "Invalid orders data structure")
+                        return False
                 else:
-                    self.log_test("Get My Orders", False, "Invalid orders data structure")
+                    self.log_test("Get My Orders", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Get My Orders", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Get My Orders", False, f"Error: {str(e)}")
             return False
     
-    def test_update_order_status(self):
+    async def test_update_order_status(self):
         """Test updating order status"""
         if not self.access_token or not self.order_id:
             self.log_test("Update Order Status", False, "No access token or order ID available")
             return False
             
         status_data = {"status": "aceito"}
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.put(f"{self.base_url}/orders/{self.order_id}/status", 
-                                  json=status_data, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if "sucesso" in data.get("message", "").lower():
-                    self.log_test("Update Order Status", True, "Order status updated successfully")
-                    return True
+            async with self.session.put(self._orders_prefix + self.order_id + "/status", json=status_data) as response:
+                if _check(response):
+                    data = await _json(response)
+                    if "sucesso" in data.get("message", "").lower():
+                        self.log_test("Update Order Status", True, "Order status updated successfully")
+                        return True
+                    else:
+                        self.log_test("Update Order Status", False, "Unexpected response message")
+                        return False
                 else:
-                    self.log_test("Update Order Status", False, "Unexpected response message")
+                    self.log_test("Update Order Status", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Update Order Status", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Update Order Status", False, f"Error: {str(e)}")
             return False
     
-    def test_unauthorized_access(self):
+    async def test_unauthorized_access(self):
         """Test accessing protected endpoints without token"""
         try:
-            response = requests.get(f"{self.base_url}/products/my")
-            if response.status_code == 403:  # Forbidden
-                self.log_test("Unauthorized Access", True, "Correctly blocked unauthorized access")
-                return True
-            else:
-                self.log_test("Unauthorized Access", False, 
-                            f"Expected 403, got {response.status_code}")
-                return False
+            # FastAPI routes don't answer HEAD (405), so this is a GET whose body is never read
+            async with self.session.get(self._url_products_my, allow_redirects=False) as response:
+                if _check(response, 403):  # Forbidden
+                    self.log_test("Unauthorized Access", True, "Correctly blocked unauthorized access")
+                    return True
+                else:
+                    self.log_test("Unauthorized Access", False, 
+                                f"Expected 403, got {response.status}")
+                    return False
         except Exception as e:
             self.log_test("Unauthorized Access", False, f"Error: {str(e)}")
             return False
     
-    def test_delete_product(self):
+    async def test_delete_product(self):
         """Test product deletion"""
         if not self.access_token or not self.product_id:
             self.log_test("Delete Product", False, "No access token or product ID available")
             return False
             
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        
         try:
-            response = requests.delete(f"{self.base_url}/products/{self.product_id}", 
-                                     headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if "excluído" in data.get("message", "").lower():
-                    self.log_test("Delete Product", True, "Product deleted successfully")
-                    return True
+            async with self.session.delete(self._products_prefix + self.product_id) as response:
+                if _check(response):
+                    data = await _json(response)
+                    if "excluído" in data.get("message", "").lower():
+                        self.log_test("Delete Product", True, "Product deleted successfully")
+                        return True
+                    else:
+                        self.log_test("Delete Product", False, "Unexpected response message")
+                        return False
                 else:
-                    self.log_test("Delete Product", False, "Unexpected response message")
+                    self.log_test("Delete Product", False, 
+                                f"Status: {response.status}, Response: {await response.text()}")
                     return False
-            else:
-                self.log_test("Delete Product", False, 
-                            f"Status: {response.status_code}, Response: {response.text}")
-                return False
         except Exception as e:
             self.log_test("Delete Product", False, f"Error: {str(e)}")
             return False
     
-    def run_all_tests(self):
-        """Run all tests in sequence"""
+    async def run_all_tests(self, summary=True):
+        """Run all tests, overlapping the ones that don't depend on each other"""
         print("🚀 Starting Brazilian Feirantes Marketplace Backend Tests")
         print("=" * 60)
         
-        # Basic connectivity
-        if not self.test_health_check():
-            print("❌ Health check failed - stopping tests")
-            return False
-        
-        # Authentication tests
-        print("\n🔐 AUTHENTICATION TESTS")
-        print("-" * 30)
-        self.test_vendor_registration()
-        self.test_vendor_login()
-        self.test_invalid_login()
-        self.test_unauthorized_access()
-        
-        # Product management tests
-        print("\n📦 PRODUCT MANAGEMENT TESTS")
-        print("-" * 30)
-        self.test_create_product()
-        self.test_get_my_products()
-        self.test_update_product()
-        
-        # Public store tests
-        print("\n🏪 PUBLIC STORE TESTS")
-        print("-" * 30)
-        self.test_public_store()
-        self.test_store_categories()
-        
-        # Order management tests
-        print("\n📋 ORDER MANAGEMENT TESTS")
-        print("-" * 30)
-        self.test_create_order()
-        self.test_get_my_orders()
-        self.test_update_order_status()
-        
-        # Cleanup tests
-        print("\n🗑️ CLEANUP TESTS")
-        print("-" * 30)
-        self.test_delete_product()
-        
-        # Summary
-        print("\n📊 TEST SUMMARY")
-        print("=" * 60)
-        passed = sum(1 for result in self.test_results if result["success"])
-        total = len(self.test_results)
-        
-        print(f"Total Tests: {total}")
-        print(f"Passed: {passed}")
-        print(f"Failed: {total - passed}")
-        print(f"Success Rate: {(passed/total)*100:.1f}%")
-        
-        if total - passed > 0:
-            print("\n❌ FAILED TESTS:")
-            for result in self.test_results:
-                if not result["success"]:
-                    print(f"  - {result['test']}: {result['message']}")
+        # Uma única sessão: conexões keep-alive reaproveitadas por todos os testes
+        connector = aiohttp.TCPConnector(limit=64, limit_per_host=32, ttl_dns_cache=300)
+        try:
+            async with aiohttp.ClientSession(
+                connector=connector,
+                headers={"Connection": "keep-alive"},
+                json_serialize=_dumps
+            ) as session:
+                self.session = session
+                
+                # Basic connectivity
+                if not await self.test_health_check():
+                    self.log("❌ Health check failed - stopping tests")
+                    return False
+                
+                # Authentication tests
+                self.log("\n🔐 AUTHENTICATION TESTS")
+                self.log("-" * 30)
+                # Requests without a token run before the session gets the Authorization header
+                await asyncio.gather(
+                    self.test_invalid_login(),
+                    self.test_unauthorized_access()
+                )
+                await self.test_vendor_registration()
+                if self.full_mode:
+                    await self.test_vendor_login()
+                
+                # Product management tests
+                self.log("\n📦 PRODUCT MANAGEMENT TESTS")
+                self.log("-" * 30)
+                await self.test_create_product()
+                await self.test_upload_product_image()
+                await self.test_products_pagination()
+                await asyncio.gather(
+                    self.test_get_my_products(),
+                    self.test_update_product()
+                )
+                
+                # Public store tests
+                self.log("\n🏪 PUBLIC STORE TESTS")
+                self.log("-" * 30)
+                await asyncio.gather(
+                    self.test_public_store(),
+                    self.test_public_store_etag(),
+                    self.test_store_categories()
+                )
+                
+                # Order management tests
+                self.log("\n📋 ORDER MANAGEMENT TESTS")
+                self.log("-" * 30)
+                await self.test_create_order()
+                await self.test_order_exceeding_stock()
+                await asyncio.gather(
+                    self.test_get_my_orders(),
+                    self.test_update_order_status()
+                )
+                
+                # Cleanup tests
+                self.log("\n🗑️ CLEANUP TESTS")
+                self.log("-" * 30)
+                await self.test_delete_product()
+        finally:
+            self.flush_output()
         
-        return passed == total
+        if summary:
+            return print_summary(self.test_results)
+        return all(result["success"] for result in self.test_results)
+
+def print_summary(test_results):
+    """Print the pass/fail summary and return True when every test passed"""
+    print("\n📊 TEST SUMMARY")
+    print("=" * 60)
+    counts = Counter(result["success"] for result in test_results)
+    passed, failed = counts[True], counts[False]
+    total = passed + failed
+    fails = [result for result in test_results if not result["success"]]
+    
+    print(f"Total Tests: {total}")
+    print(f"Passed: {passed}")
+    print(f"Failed: {failed}")
+    print(f"Success Rate: {(passed/total)*100:.1f}%")
+    
+    if fails:
+        print("\n❌ FAILED TESTS:")
+        for result in fails:
+            print(f"  - {result['test']}: {result['message']}")
+    
+    return failed == 0
+
+async def main(n=1):
+    """Run the suite with n independent vendors in parallel (load/smoke mode when n > 1)"""
+    if n == 1:
+        return await FeirantesAPITester().run_all_tests()
+    testers = [FeirantesAPITester() for _ in range(n)]
+    await asyncio.gather(*[tester.run_all_tests(summary=False) for tester in testers])
+    return print_summary([result for tester in testers for result in tester.test_results])
 
 if __name__ == "__main__":
-    tester = FeirantesAPITester()
-    success = tester.run_all_tests()
+    # Usage: python backend_test.py [N parallel vendors] [--full] [-v]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("-")]
+    success = asyncio.run(main(int(args[0]) if args else 1))
     
     if success:
         print("\n🎉 All tests passed! Backend is working correctly.")
     else:
-        print("\n⚠️ Some tests failed. Check the details above.")
\ No newline at end of file
+        print("\n⚠️ Some tests failed. Check the details above.")
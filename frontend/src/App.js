@@ -73,8 +73,8 @@ const Header = ({ title, showBack = false, onBack, showHome = false }) => (
 
 const ProductCard = ({ product, isOwner = false, onEdit, onDelete, onAddToCart }) => (
   <div className="bg-white rounded-lg shadow-md overflow-hidden">
-    {product.imagem && (
-      <img src={product.imagem} alt={product.nome} className="w-full h-48 object-cover" />
+    {(product.imagem_url || product.imagem) && (
+      <img src={product.imagem_url || product.imagem} alt={product.nome} className="w-full h-48 object-cover" />
     )}
     <div className="p-4">
       <h3 className="font-bold text-lg mb-2">{product.nome}</h3>
@@ -627,7 +627,7 @@ const Dashboard = () => {
                           <label className="block text-sm font-medium mb-1">Foto do Produto</label>
                           <input
                             type="file"
-                            accept="image/*"
+                            accept="image/png,image/jpeg,image/webp"
                             onChange={handleImageUpload}
                             className="w-full px-3 py-2 border rounded-md"
                           />
@@ -681,7 +681,7 @@ const Dashboard = () => {
                           preco: product.preco.toString(),
                           quantidade: product.quantidade.toString(),
                           categoria: product.categoria,
-                          imagem: product.imagem || ''
+                          imagem: product.imagem_url || product.imagem || ''
                         });
                         setShowProductForm(true);
                       }}